@@ -1,5 +1,7 @@
 import base64
+import functools
 from math import ceil
+import operator
 import struct
 import sys
 
@@ -11,6 +13,14 @@ except ImportError:
     except ImportError:
         AES = None
 
+if AES is None:
+    # OpenSSL-backed fallback; usually present as a dependency of secretstorage
+    try:
+        from cryptography.exceptions import InvalidTag
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    except ImportError:
+        Cipher = None
+
 def compat_ord(c):
     return c if isinstance(c, int) else ord(c)
 
@@ -26,29 +36,104 @@ def bytes_to_intlist(bs):
 def intlist_to_bytes(xs):
     if not xs:
         return b''
-    return struct.pack('%dB' % len(xs), *xs)
+    return bytes(xs)
 
 if AES:
     def aes_cbc_decrypt_bytes(data, key, iv):
         """ Decrypt bytes with AES-CBC using pycryptodome """
         return AES.new(key, AES.MODE_CBC, iv).decrypt(data)
 
+    def aes_cbc_encrypt_bytes(data, key, iv, *, padding_mode='pkcs7'):
+        """ Encrypt bytes with AES-CBC using pycryptodome """
+        if data:
+            last_block = (len(data) - 1) // BLOCK_SIZE_BYTES * BLOCK_SIZE_BYTES
+            data = data[:last_block] + pad_block(data[last_block:], padding_mode)
+        return AES.new(key, AES.MODE_CBC, iv).encrypt(data)
+
+    def aes_ecb_encrypt_bytes(data, key):
+        """ Encrypt bytes with AES-ECB using pycryptodome """
+        if len(data) % BLOCK_SIZE_BYTES:
+            data = pkcs7_padding(data)
+        return AES.new(key, AES.MODE_ECB).encrypt(data)
+
+    def aes_ecb_decrypt_bytes(data, key):
+        """ Decrypt bytes with AES-ECB using pycryptodome """
+        return AES.new(key, AES.MODE_ECB).decrypt(data)
+
+    def aes_ctr_encrypt_bytes(data, key, iv):
+        """ Encrypt bytes with AES-CTR using pycryptodome """
+        return AES.new(key, AES.MODE_CTR, nonce=b'', initial_value=iv).encrypt(data)
+
     def aes_gcm_decrypt_and_verify_bytes(data, key, tag, nonce):
         """ Decrypt bytes with AES-GCM using pycryptodome """
         return AES.new(key, AES.MODE_GCM, nonce).decrypt_and_verify(data, tag)
 
+elif Cipher:
+    def _cryptography_apply(context, data):
+        return context.update(data) + context.finalize()
+
+    def aes_cbc_decrypt_bytes(data, key, iv):
+        """ Decrypt bytes with AES-CBC using cryptography """
+        return _cryptography_apply(Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor(), data)
+
+    def aes_cbc_encrypt_bytes(data, key, iv, *, padding_mode='pkcs7'):
+        """ Encrypt bytes with AES-CBC using cryptography """
+        if data:
+            last_block = (len(data) - 1) // BLOCK_SIZE_BYTES * BLOCK_SIZE_BYTES
+            data = data[:last_block] + pad_block(data[last_block:], padding_mode)
+        return _cryptography_apply(Cipher(algorithms.AES(key), modes.CBC(iv)).encryptor(), data)
+
+    def aes_ecb_encrypt_bytes(data, key):
+        """ Encrypt bytes with AES-ECB using cryptography """
+        if len(data) % BLOCK_SIZE_BYTES:
+            data = pkcs7_padding(data)
+        return _cryptography_apply(Cipher(algorithms.AES(key), modes.ECB()).encryptor(), data)
+
+    def aes_ecb_decrypt_bytes(data, key):
+        """ Decrypt bytes with AES-ECB using cryptography """
+        return _cryptography_apply(Cipher(algorithms.AES(key), modes.ECB()).decryptor(), data)
+
+    def aes_ctr_encrypt_bytes(data, key, iv):
+        """ Encrypt bytes with AES-CTR using cryptography """
+        return _cryptography_apply(Cipher(algorithms.AES(key), modes.CTR(iv)).encryptor(), data)
+
+    def aes_gcm_decrypt_and_verify_bytes(data, key, tag, nonce):
+        """ Decrypt bytes with AES-GCM using cryptography """
+        if len(nonce) < 8:  # rejected by cryptography
+            return aes_gcm_decrypt_and_verify(data, key, tag, nonce)
+        try:
+            return _cryptography_apply(Cipher(algorithms.AES(key), modes.GCM(nonce, tag)).decryptor(), data)
+        except InvalidTag:
+            raise ValueError('Mismatching authentication tag')
+
 else:
     def aes_cbc_decrypt_bytes(data, key, iv):
-        """ Decrypt bytes with AES-CBC using native implementation since pycryptodome is unavailable """
-        return intlist_to_bytes(aes_cbc_decrypt(*map(bytes_to_intlist, (data, key, iv))))
+        """ Decrypt bytes with AES-CBC using native implementation since no AES library is available """
+        return aes_cbc_decrypt(data, key, iv)
+
+    def aes_cbc_encrypt_bytes(data, key, iv, **kwargs):
+        """ Encrypt bytes with AES-CBC using native implementation since no AES library is available """
+        return aes_cbc_encrypt(data, key, iv, **kwargs)
+
+    def aes_ecb_encrypt_bytes(data, key):
+        """ Encrypt bytes with AES-ECB using native implementation since no AES library is available """
+        return aes_ecb_encrypt(data, key)
+
+    def aes_ecb_decrypt_bytes(data, key):
+        """ Decrypt bytes with AES-ECB using native implementation since no AES library is available """
+        return aes_ecb_decrypt(data, key)
+
+    def aes_ctr_encrypt_bytes(data, key, iv):
+        """ Encrypt bytes with AES-CTR using native implementation since no AES library is available """
+        return aes_ctr_encrypt(data, key, iv)
 
     def aes_gcm_decrypt_and_verify_bytes(data, key, tag, nonce):
-        """ Decrypt bytes with AES-GCM using native implementation since pycryptodome is unavailable """
-        return intlist_to_bytes(aes_gcm_decrypt_and_verify(*map(bytes_to_intlist, (data, key, tag, nonce))))
+        """ Decrypt bytes with AES-GCM using native implementation since no AES library is available """
+        return aes_gcm_decrypt_and_verify(data, key, tag, nonce)
 
 
-def aes_cbc_encrypt_bytes(data, key, iv, **kwargs):
-    return intlist_to_bytes(aes_cbc_encrypt(*map(bytes_to_intlist, (data, key, iv)), **kwargs))
+def aes_ctr_decrypt_bytes(data, key, iv):
+    return aes_ctr_encrypt_bytes(data, key, iv)
 
 
 BLOCK_SIZE_BYTES = 16
@@ -62,19 +147,20 @@ def pkcs7_padding(data):
     """
     PKCS#7 padding
 
-    @param {int[]} data        cleartext
-    @returns {int[]}           padding data
+    @param {bytes} data        cleartext
+    @returns {bytes}           padding data
     """
 
     remaining_length = BLOCK_SIZE_BYTES - len(data) % BLOCK_SIZE_BYTES
-    return data + [remaining_length] * remaining_length
+    return bytes(data) + bytes([remaining_length]) * remaining_length
 
 
 def pad_block(block, padding_mode):
     """
     Pad a block with the given padding mode
-    @param {int[]} block        block to pad
+    @param {bytes} block        block to pad
     @param padding_mode         padding mode
+    @returns {bytes}            padded block
     """
     padding_size = BLOCK_SIZE_BYTES - len(block)
 
@@ -90,60 +176,64 @@ def pad_block(block, padding_mode):
     elif padding_mode not in PADDING_BYTE:
         raise NotImplementedError(f'Padding mode {padding_mode} is not implemented')
 
+    block = bytes(block)
     if padding_mode == 'iso7816' and padding_size:
-        block = [*block, 0x80]  # NB: += mutates list
+        block += b'\x80'
         padding_size -= 1
 
-    return block + [PADDING_BYTE[padding_mode]] * padding_size
+    return block + bytes([PADDING_BYTE[padding_mode]]) * padding_size
 
 
 def aes_ecb_encrypt(data, key, iv=None):
     """
     Encrypt with aes in ECB mode. Using PKCS#7 padding
 
-    @param {int[]} data        cleartext
-    @param {int[]} key         16/24/32-Byte cipher key
-    @param {int[]} iv          Unused for this mode
-    @returns {int[]}           encrypted data
+    @param {bytes} data        cleartext
+    @param {bytes} key         16/24/32-Byte cipher key
+    @param {bytes} iv          Unused for this mode
+    @returns {bytes}           encrypted data
     """
-    expanded_key = key_expansion(key)
-    block_count = int(ceil(float(len(data)) / BLOCK_SIZE_BYTES))
+    expanded_key = cached_key_expansion(bytes(key))
+    data = bytes(data)
+    if len(data) % BLOCK_SIZE_BYTES:
+        data = pkcs7_padding(data)
+    data = memoryview(data)
 
-    encrypted_data = []
-    for i in range(block_count):
-        block = data[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES]
-        encrypted_data += aes_encrypt(pkcs7_padding(block), expanded_key)
+    encrypted_data = bytearray(len(data))
+    for i in range(0, len(data), BLOCK_SIZE_BYTES):
+        encrypted_data[i: i + BLOCK_SIZE_BYTES] = aes_encrypt(data[i: i + BLOCK_SIZE_BYTES], expanded_key)
 
-    return encrypted_data
+    return bytes(encrypted_data)
 
 
 def aes_ecb_decrypt(data, key, iv=None):
     """
     Decrypt with aes in ECB mode
 
-    @param {int[]} data        cleartext
-    @param {int[]} key         16/24/32-Byte cipher key
-    @param {int[]} iv          Unused for this mode
-    @returns {int[]}           decrypted data
+    @param {bytes} data        cleartext
+    @param {bytes} key         16/24/32-Byte cipher key
+    @param {bytes} iv          Unused for this mode
+    @returns {bytes}           decrypted data
     """
-    expanded_key = key_expansion(key)
+    expanded_key = cached_key_expansion(bytes(key))
     block_count = int(ceil(float(len(data)) / BLOCK_SIZE_BYTES))
+    data_length = len(data)
+    data = memoryview(bytes(data).ljust(block_count * BLOCK_SIZE_BYTES, b'\0'))
 
-    encrypted_data = []
-    for i in range(block_count):
-        block = data[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES]
-        encrypted_data += aes_decrypt(block, expanded_key)
-    return encrypted_data[:len(data)]
+    decrypted_data = bytearray(len(data))
+    for i in range(0, len(data), BLOCK_SIZE_BYTES):
+        decrypted_data[i: i + BLOCK_SIZE_BYTES] = aes_decrypt(data[i: i + BLOCK_SIZE_BYTES], expanded_key)
+    return bytes(decrypted_data[:data_length])
 
 
 def aes_ctr_decrypt(data, key, iv):
     """
     Decrypt with aes in counter mode
 
-    @param {int[]} data        cipher
-    @param {int[]} key         16/24/32-Byte cipher key
-    @param {int[]} iv          16-Byte initialization vector
-    @returns {int[]}           decrypted data
+    @param {bytes} data        cipher
+    @param {bytes} key         16/24/32-Byte cipher key
+    @param {bytes} iv          16-Byte initialization vector
+    @returns {bytes}           decrypted data
     """
     return aes_ctr_encrypt(data, key, iv)
 
@@ -152,117 +242,113 @@ def aes_ctr_encrypt(data, key, iv):
     """
     Encrypt with aes in counter mode
 
-    @param {int[]} data        cleartext
-    @param {int[]} key         16/24/32-Byte cipher key
-    @param {int[]} iv          16-Byte initialization vector
-    @returns {int[]}           encrypted data
+    @param {bytes} data        cleartext
+    @param {bytes} key         16/24/32-Byte cipher key
+    @param {bytes} iv          16-Byte initialization vector
+    @returns {bytes}           encrypted data
     """
-    expanded_key = key_expansion(key)
+    return _aes_ctr_encrypt_expanded(data, cached_key_expansion(bytes(key)), iv)
+
+
+def _aes_ctr_encrypt_expanded(data, expanded_key, iv):
     block_count = int(ceil(float(len(data)) / BLOCK_SIZE_BYTES))
     counter = iter_vector(iv)
 
-    encrypted_data = []
-    for i in range(block_count):
-        counter_block = next(counter)
-        block = data[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES]
-        block += [0] * (BLOCK_SIZE_BYTES - len(block))
-
-        cipher_counter_block = aes_encrypt(counter_block, expanded_key)
-        encrypted_data += xor(block, cipher_counter_block)
-    return encrypted_data[:len(data)]
+    # Blocks are independent: build the whole keystream, then xor it in one go
+    keystream = b''.join(aes_encrypt(next(counter), expanded_key) for _ in range(block_count))
+    return xor_bytes(bytes(data), keystream[:len(data)])
 
 
 def aes_cbc_decrypt(data, key, iv):
     """
     Decrypt with aes in CBC mode
 
-    @param {int[]} data        cipher
-    @param {int[]} key         16/24/32-Byte cipher key
-    @param {int[]} iv          16-Byte IV
-    @returns {int[]}           decrypted data
+    @param {bytes} data        cipher
+    @param {bytes} key         16/24/32-Byte cipher key
+    @param {bytes} iv          16-Byte IV
+    @returns {bytes}           decrypted data
     """
-    expanded_key = key_expansion(key)
+    expanded_key = cached_key_expansion(bytes(key))
     block_count = int(ceil(float(len(data)) / BLOCK_SIZE_BYTES))
+    data_length = len(data)
+    data = memoryview(bytes(data).ljust(block_count * BLOCK_SIZE_BYTES, b'\0'))
 
-    decrypted_data = []
-    previous_cipher_block = iv
-    for i in range(block_count):
-        block = data[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES]
-        block += [0] * (BLOCK_SIZE_BYTES - len(block))
-
-        decrypted_block = aes_decrypt(block, expanded_key)
-        decrypted_data += xor(decrypted_block, previous_cipher_block)
-        previous_cipher_block = block
-    return decrypted_data[:len(data)]
+    decrypted_data = b''.join(
+        aes_decrypt(data[i: i + BLOCK_SIZE_BYTES], expanded_key) for i in range(0, len(data), BLOCK_SIZE_BYTES))
+    # Every block is chained to the previous cipher block, so xor against the shifted ciphertext in one go
+    previous_cipher_blocks = (bytes(iv) + data)[:len(data)]
+    return xor_bytes(decrypted_data, previous_cipher_blocks)[:data_length]
 
 
 def aes_cbc_encrypt(data, key, iv, *, padding_mode='pkcs7'):
     """
     Encrypt with aes in CBC mode
 
-    @param {int[]} data        cleartext
-    @param {int[]} key         16/24/32-Byte cipher key
-    @param {int[]} iv          16-Byte IV
+    @param {bytes} data        cleartext
+    @param {bytes} key         16/24/32-Byte cipher key
+    @param {bytes} iv          16-Byte IV
     @param padding_mode        Padding mode to use
-    @returns {int[]}           encrypted data
+    @returns {bytes}           encrypted data
     """
-    expanded_key = key_expansion(key)
+    expanded_key = cached_key_expansion(bytes(key))
     block_count = int(ceil(float(len(data)) / BLOCK_SIZE_BYTES))
+    data = memoryview(bytes(data))
 
-    encrypted_data = []
-    previous_cipher_block = iv
-    for i in range(block_count):
-        block = data[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES]
-        block = pad_block(block, padding_mode)
+    encrypted_data = bytearray(block_count * BLOCK_SIZE_BYTES)
+    previous_cipher_block = bytes(iv)
+    for i in range(0, len(encrypted_data), BLOCK_SIZE_BYTES):
+        block = pad_block(data[i: i + BLOCK_SIZE_BYTES], padding_mode)
 
-        mixed_block = xor(block, previous_cipher_block)
+        mixed_block = xor_bytes(block, previous_cipher_block)
 
         encrypted_block = aes_encrypt(mixed_block, expanded_key)
-        encrypted_data += encrypted_block
+        encrypted_data[i: i + BLOCK_SIZE_BYTES] = encrypted_block
 
         previous_cipher_block = encrypted_block
 
-    return encrypted_data
+    return bytes(encrypted_data)
 
 
 def aes_gcm_decrypt_and_verify(data, key, tag, nonce):
     """
     Decrypt with aes in GBM mode and checks authenticity using tag
 
-    @param {int[]} data        cipher
-    @param {int[]} key         16-Byte cipher key
-    @param {int[]} tag         authentication tag
-    @param {int[]} nonce       IV (recommended 12-Byte)
-    @returns {int[]}           decrypted data
+    @param {bytes} data        cipher
+    @param {bytes} key         16-Byte cipher key
+    @param {bytes} tag         authentication tag
+    @param {bytes} nonce       IV (recommended 12-Byte)
+    @returns {bytes}           decrypted data
     """
 
     # XXX: check aes, gcm param
 
-    hash_subkey = aes_encrypt([0] * BLOCK_SIZE_BYTES, key_expansion(key))
+    data, key, tag, nonce = map(bytes, (data, key, tag, nonce))
+    expanded_key = cached_key_expansion(key)
+    hash_subkey = aes_encrypt(bytes(BLOCK_SIZE_BYTES), expanded_key)
 
     if len(nonce) == 12:
-        j0 = [*nonce, 0, 0, 0, 1]
+        j0 = nonce + b'\x00\x00\x00\x01'
     else:
         fill = (BLOCK_SIZE_BYTES - (len(nonce) % BLOCK_SIZE_BYTES)) % BLOCK_SIZE_BYTES + 8
-        ghash_in = nonce + [0] * fill + bytes_to_intlist((8 * len(nonce)).to_bytes(8, 'big'))
-        j0 = ghash(hash_subkey, ghash_in)
+        ghash_in = nonce + bytes(fill) + (8 * len(nonce)).to_bytes(8, 'big')
+        j0 = bytes(ghash(hash_subkey, ghash_in))
 
     # TODO: add nonce support to aes_ctr_decrypt
 
     # nonce_ctr = j0[:12]
     iv_ctr = inc(j0)
 
-    decrypted_data = aes_ctr_decrypt(data, key, iv_ctr + [0] * (BLOCK_SIZE_BYTES - len(iv_ctr)))
+    decrypted_data = _aes_ctr_encrypt_expanded(data, expanded_key, iv_ctr)
     pad_len = (BLOCK_SIZE_BYTES - (len(data) % BLOCK_SIZE_BYTES)) % BLOCK_SIZE_BYTES
     s_tag = ghash(
         hash_subkey,
         data
-        + [0] * pad_len                                         # pad
-        + bytes_to_intlist((0 * 8).to_bytes(8, 'big')           # length of associated data
-                           + ((len(data) * 8).to_bytes(8, 'big'))),  # length of data
+        + bytes(pad_len)                                        # pad
+        + (0 * 8).to_bytes(8, 'big')                            # length of associated data
+        + (len(data) * 8).to_bytes(8, 'big'),                   # length of data
     )
 
-    if tag != aes_ctr_encrypt(s_tag, key, j0):
+    if tag != _aes_ctr_encrypt_expanded(s_tag, expanded_key, j0):
         raise ValueError('Mismatching authentication tag')
 
     return decrypted_data
@@ -272,40 +358,42 @@ def aes_encrypt(data, expanded_key):
     """
     Encrypt one block with aes
 
-    @param {int[]} data          16-Byte state
-    @param {int[]} expanded_key  176/208/240-Byte expanded key
-    @returns {int[]}             16-Byte cipher
+    @param {bytes} data          16-Byte state
+    @param {bytes} expanded_key  176/208/240-Byte expanded key
+    @returns {bytes}             16-Byte cipher
     """
-    rounds = len(expanded_key) // BLOCK_SIZE_BYTES - 1
+    expanded_key = bytes(expanded_key)
+    round_keys = round_key_words(expanded_key)
 
-    data = xor(data, expanded_key[:BLOCK_SIZE_BYTES])
-    for i in range(1, rounds + 1):
-        data = sub_bytes(data)
-        data = shift_rows(data)
-        if i != rounds:
-            data = list(iter_mix_columns(data, MIX_COLUMN_MATRIX))
-        data = xor(data, expanded_key[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES])
+    s0, s1, s2, s3 = struct.unpack('>4I', bytes(data))
+    # SubBytes, ShiftRows and MixColumns fused into table lookups
+    s0, s1, s2, s3 = ENCRYPT_ROUNDS[len(round_keys) // 4 - 1](
+        s0 ^ round_keys[0], s1 ^ round_keys[1], s2 ^ round_keys[2], s3 ^ round_keys[3], round_keys)
 
-    return data
+    # The last round has no MixColumns
+    data = sub_bytes(shift_rows(struct.pack('>4I', s0, s1, s2, s3)))
+    return xor_bytes(data, expanded_key[-BLOCK_SIZE_BYTES:])
 
 
 def aes_decrypt(data, expanded_key):
     """
     Decrypt one block with aes
 
-    @param {int[]} data          16-Byte cipher
-    @param {int[]} expanded_key  176/208/240-Byte expanded key
-    @returns {int[]}             16-Byte state
+    @param {bytes} data          16-Byte cipher
+    @param {bytes} expanded_key  176/208/240-Byte expanded key
+    @returns {bytes}             16-Byte state
     """
-    rounds = len(expanded_key) // BLOCK_SIZE_BYTES - 1
+    expanded_key = bytes(expanded_key)
+    round_keys = inv_round_key_words(expanded_key)
 
-    for i in range(rounds, 0, -1):
-        data = xor(data, expanded_key[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES])
-        if i != rounds:
-            data = list(iter_mix_columns(data, MIX_COLUMN_MATRIX_INV))
-        data = shift_rows_inv(data)
-        data = sub_bytes_inv(data)
-    return xor(data, expanded_key[:BLOCK_SIZE_BYTES])
+    s0, s1, s2, s3 = struct.unpack('>4I', bytes(data))
+    # InvShiftRows, InvSubBytes and InvMixColumns fused into table lookups
+    s0, s1, s2, s3 = DECRYPT_ROUNDS[len(round_keys) // 4 - 1](
+        s0 ^ round_keys[-4], s1 ^ round_keys[-3], s2 ^ round_keys[-2], s3 ^ round_keys[-1], round_keys)
+
+    # The last round has no InvMixColumns
+    data = sub_bytes_inv(shift_rows_inv(struct.pack('>4I', s0, s1, s2, s3)))
+    return xor_bytes(data, expanded_key[:BLOCK_SIZE_BYTES])
 
 
 def aes_decrypt_text(data, password, key_size_bytes):
@@ -319,21 +407,20 @@ def aes_decrypt_text(data, password, key_size_bytes):
     @param {str} data                    Base64 encoded string
     @param {str,unicode} password        Password (will be encoded with utf-8)
     @param {int} key_size_bytes          Possible values: 16 for 128-Bit, 24 for 192-Bit or 32 for 256-Bit
-    @returns {str}                       Decrypted data
+    @returns {bytes}                     Decrypted data
     """
     NONCE_LENGTH_BYTES = 8
 
-    data = bytes_to_intlist(base64.b64decode(data))
-    password = bytes_to_intlist(password.encode())
+    data = memoryview(base64.b64decode(data))
+    password = password.encode()
 
-    key = password[:key_size_bytes] + [0] * (key_size_bytes - len(password))
-    key = aes_encrypt(key[:BLOCK_SIZE_BYTES], key_expansion(key)) * (key_size_bytes // BLOCK_SIZE_BYTES)
+    key = password[:key_size_bytes].ljust(key_size_bytes, b'\0')
+    key = aes_ecb_encrypt_bytes(key[:BLOCK_SIZE_BYTES], key) * (key_size_bytes // BLOCK_SIZE_BYTES)
 
-    nonce = data[:NONCE_LENGTH_BYTES]
+    nonce = bytes(data[:NONCE_LENGTH_BYTES])
     cipher = data[NONCE_LENGTH_BYTES:]
 
-    decrypted_data = aes_ctr_decrypt(cipher, key, nonce + [0] * (BLOCK_SIZE_BYTES - NONCE_LENGTH_BYTES))
-    return intlist_to_bytes(decrypted_data)
+    return aes_ctr_decrypt_bytes(cipher, key, nonce.ljust(BLOCK_SIZE_BYTES, b'\0'))
 
 
 RCON = (0x8d, 0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80, 0x1b, 0x36)
@@ -369,14 +456,6 @@ SBOX_INV = (0x52, 0x09, 0x6a, 0xd5, 0x30, 0x36, 0xa5, 0x38, 0xbf, 0x40, 0xa3, 0x
             0x60, 0x51, 0x7f, 0xa9, 0x19, 0xb5, 0x4a, 0x0d, 0x2d, 0xe5, 0x7a, 0x9f, 0x93, 0xc9, 0x9c, 0xef,
             0xa0, 0xe0, 0x3b, 0x4d, 0xae, 0x2a, 0xf5, 0xb0, 0xc8, 0xeb, 0xbb, 0x3c, 0x83, 0x53, 0x99, 0x61,
             0x17, 0x2b, 0x04, 0x7e, 0xba, 0x77, 0xd6, 0x26, 0xe1, 0x69, 0x14, 0x63, 0x55, 0x21, 0x0c, 0x7d)
-MIX_COLUMN_MATRIX = ((0x2, 0x3, 0x1, 0x1),
-                     (0x1, 0x2, 0x3, 0x1),
-                     (0x1, 0x1, 0x2, 0x3),
-                     (0x3, 0x1, 0x1, 0x2))
-MIX_COLUMN_MATRIX_INV = ((0xE, 0xB, 0xD, 0x9),
-                         (0x9, 0xE, 0xB, 0xD),
-                         (0xD, 0x9, 0xE, 0xB),
-                         (0xB, 0xD, 0x9, 0xE))
 RIJNDAEL_EXP_TABLE = (0x01, 0x03, 0x05, 0x0F, 0x11, 0x33, 0x55, 0xFF, 0x1A, 0x2E, 0x72, 0x96, 0xA1, 0xF8, 0x13, 0x35,
                       0x5F, 0xE1, 0x38, 0x48, 0xD8, 0x73, 0x95, 0xA4, 0xF7, 0x02, 0x06, 0x0A, 0x1E, 0x22, 0x66, 0xAA,
                       0xE5, 0x34, 0x5C, 0xE4, 0x37, 0x59, 0xEB, 0x26, 0x6A, 0xBE, 0xD9, 0x70, 0x90, 0xAB, 0xE6, 0x31,
@@ -411,111 +490,197 @@ RIJNDAEL_LOG_TABLE = (0x00, 0x00, 0x19, 0x01, 0x32, 0x02, 0x1a, 0xc6, 0x4b, 0xc7
                       0x67, 0x4a, 0xed, 0xde, 0xc5, 0x31, 0xfe, 0x18, 0x0d, 0x63, 0x8c, 0x80, 0xc0, 0xf7, 0x70, 0x07)
 
 
+# Translation tables so SubBytes runs as a single bytes.translate call
+SBOX_TABLE = bytes(SBOX)
+SBOX_INV_TABLE = bytes(SBOX_INV)
+
+
+def gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return RIJNDAEL_EXP_TABLE[(RIJNDAEL_LOG_TABLE[a] + RIJNDAEL_LOG_TABLE[b]) % 0xFF]
+
+
+# Multiplication tables for the MixColumns coefficients
+MUL2 = bytes(gf_mul(x, 0x2) for x in range(256))
+MUL3 = bytes(gf_mul(x, 0x3) for x in range(256))
+MUL9 = bytes(gf_mul(x, 0x9) for x in range(256))
+MUL11 = bytes(gf_mul(x, 0xB) for x in range(256))
+MUL13 = bytes(gf_mul(x, 0xD) for x in range(256))
+MUL14 = bytes(gf_mul(x, 0xE) for x in range(256))
+
+
+def rotate_word(word):
+    return (word >> 8) | (word & 0xFF) << 24
+
+
+# T-tables: SubBytes followed by one MixColumns column, packed as big-endian words
+TE0 = tuple(MUL2[s] << 24 | s << 16 | s << 8 | MUL3[s] for s in SBOX)
+TE1 = tuple(map(rotate_word, TE0))
+TE2 = tuple(map(rotate_word, TE1))
+TE3 = tuple(map(rotate_word, TE2))
+TD0 = tuple(MUL14[s] << 24 | MUL9[s] << 16 | MUL13[s] << 8 | MUL11[s] for s in SBOX_INV)
+TD1 = tuple(map(rotate_word, TD0))
+TD2 = tuple(map(rotate_word, TD1))
+TD3 = tuple(map(rotate_word, TD2))
+
+
+def unrolled_rounds(rounds, tables, decrypt=False):
+    """
+    Generate the inner rounds for one key size with the loop fully unrolled
+
+    @param {int} rounds      10/12/14 rounds
+    @param tables            TE0..TE3 or TD0..TD3
+    @param {bool} decrypt    run the rounds backwards with InvShiftRows
+    @returns                 function(s0, s1, s2, s3, round_keys) -> (s0, s1, s2, s3)
+    """
+    step = -1 if decrypt else 1
+    source = ['def inner_rounds(s0, s1, s2, s3, rk, T0=T0, T1=T1, T2=T2, T3=T3):']
+    for i in (range(rounds - 1, 0, -1) if decrypt else range(1, rounds)):
+        for column in range(4):
+            a, b, c, d = ((column + step * row) & 0b11 for row in range(4))
+            source.append(
+                f'    t{column} = T0[s{a} >> 24] ^ T1[(s{b} >> 16) & 0xFF] ^ T2[(s{c} >> 8) & 0xFF]'
+                f' ^ T3[s{d} & 0xFF] ^ rk[{i * 4 + column}]')
+        source.append('    s0, s1, s2, s3 = t0, t1, t2, t3')
+    source.append('    return s0, s1, s2, s3')
+
+    namespace = dict(zip(('T0', 'T1', 'T2', 'T3'), tables))
+    exec('\n'.join(source), namespace)
+    return namespace['inner_rounds']
+
+
+ENCRYPT_ROUNDS = {rounds: unrolled_rounds(rounds, (TE0, TE1, TE2, TE3)) for rounds in (10, 12, 14)}
+DECRYPT_ROUNDS = {rounds: unrolled_rounds(rounds, (TD0, TD1, TD2, TD3), decrypt=True) for rounds in (10, 12, 14)}
+
+
+# ShiftRows is a fixed byte permutation of the column-major state
+SHIFT_ROWS = operator.itemgetter(
+    *(((column + row) & 0b11) * 4 + row for column in range(4) for row in range(4)))
+SHIFT_ROWS_INV = operator.itemgetter(
+    *(((column - row) & 0b11) * 4 + row for column in range(4) for row in range(4)))
+
+GHASH_R = 0xE1 << 120
+GHASH_PARALLEL_BLOCKS = 8
+
+
 def key_expansion(data):
     """
     Generate key schedule
 
-    @param {int[]} data  16/24/32-Byte cipher key
-    @returns {int[]}     176/208/240-Byte expanded key
+    @param {bytes} data  16/24/32-Byte cipher key
+    @returns {bytes}     176/208/240-Byte expanded key
     """
-    data = data[:]  # copy
-    rcon_iteration = 1
     key_size_bytes = len(data)
     expanded_key_size_bytes = (key_size_bytes // 4 + 7) * BLOCK_SIZE_BYTES
 
-    while len(data) < expanded_key_size_bytes:
-        temp = data[-4:]
-        temp = key_schedule_core(temp, rcon_iteration)
-        rcon_iteration += 1
-        data += xor(temp, data[-key_size_bytes: 4 - key_size_bytes])
+    expanded_key = bytearray(expanded_key_size_bytes)
+    expanded_key[:key_size_bytes] = bytes(data)
+    rcon_iteration = 1
+    for pos in range(key_size_bytes, expanded_key_size_bytes, 4):
+        temp = expanded_key[pos - 4: pos]
+        if pos % key_size_bytes == 0:
+            temp = key_schedule_core(temp, rcon_iteration)
+            rcon_iteration += 1
+        elif key_size_bytes == 32 and pos % key_size_bytes == 16:
+            temp = sub_bytes(temp)
+        expanded_key[pos: pos + 4] = xor_bytes(temp, expanded_key[pos - key_size_bytes: pos - key_size_bytes + 4])
+    return bytes(expanded_key)
 
-        for _ in range(3):
-            temp = data[-4:]
-            data += xor(temp, data[-key_size_bytes: 4 - key_size_bytes])
 
-        if key_size_bytes == 32:
-            temp = data[-4:]
-            temp = sub_bytes(temp)
-            data += xor(temp, data[-key_size_bytes: 4 - key_size_bytes])
+@functools.lru_cache(maxsize=32)
+def cached_key_expansion(key):
+    """
+    Memoized key_expansion for callers that reuse a key across many calls
+
+    @param {bytes} key  16/24/32-Byte cipher key
+    @returns {bytes}    176/208/240-Byte expanded key
+    """
+    return key_expansion(key)
+
+
+@functools.lru_cache(maxsize=32)
+def round_key_words(expanded_key):
+    """
+    Split an expanded key into 32-bit big-endian words for the T-table rounds
+
+    @param {bytes} expanded_key  176/208/240-Byte expanded key
+    @returns {int[]}             44/52/60 round key words
+    """
+    return struct.unpack('>%dI' % (len(expanded_key) // 4), expanded_key)
+
 
-        for _ in range(3 if key_size_bytes == 32 else 2 if key_size_bytes == 24 else 0):
-            temp = data[-4:]
-            data += xor(temp, data[-key_size_bytes: 4 - key_size_bytes])
-    return data[:expanded_key_size_bytes]
+@functools.lru_cache(maxsize=32)
+def inv_round_key_words(expanded_key):
+    """
+    Round key words for the equivalent inverse cipher: the inner round keys
+    get InvMixColumns applied so it can be folded into the TD tables
+
+    @param {bytes} expanded_key  176/208/240-Byte expanded key
+    @returns {int[]}             44/52/60 round key words
+    """
+    words = list(round_key_words(expanded_key))
+    for i in range(BLOCK_SIZE_BYTES, len(expanded_key) - BLOCK_SIZE_BYTES, BLOCK_SIZE_BYTES):
+        words[i // 4: i // 4 + 4] = struct.unpack('>4I', bytes(mix_columns_inv(expanded_key[i:i + BLOCK_SIZE_BYTES])))
+    return tuple(words)
 
 
 def iter_vector(iv):
+    # Carry the counter as an int and only materialize the block bytes
+    size = len(iv)
+    counter = int.from_bytes(bytes(iv), 'big')
     while True:
-        yield iv
-        iv = inc(iv)
+        yield counter.to_bytes(size, 'big')
+        counter = (counter + 1) & ((1 << size * 8) - 1)
 
 
 def sub_bytes(data):
-    return [SBOX[x] for x in data]
+    return bytes(data).translate(SBOX_TABLE)
 
 
 def sub_bytes_inv(data):
-    return [SBOX_INV[x] for x in data]
+    return bytes(data).translate(SBOX_INV_TABLE)
 
 
 def rotate(data):
-    return data[1:] + [data[0]]
+    return data[1:] + data[:1]
 
 
 def key_schedule_core(data, rcon_iteration):
     data = rotate(data)
-    data = sub_bytes(data)
+    data = bytearray(sub_bytes(data))
     data[0] = data[0] ^ RCON[rcon_iteration]
 
     return data
 
 
-def xor(data1, data2):
-    return [x ^ y for x, y in zip(data1, data2)]
+def xor_bytes(data1, data2):
+    return (int.from_bytes(data1, 'big') ^ int.from_bytes(data2, 'big')).to_bytes(len(data1), 'big')
 
 
-def iter_mix_columns(data, matrix):
+def mix_columns_inv(data):
+    mixed = []
     for i in (0, 4, 8, 12):
-        for row in matrix:
-            mixed = 0
-            for j in range(4):
-                # xor is (+) and (-)
-                mixed ^= (0 if data[i:i + 4][j] == 0 or row[j] == 0 else
-                          RIJNDAEL_EXP_TABLE[(RIJNDAEL_LOG_TABLE[data[i + j]] + RIJNDAEL_LOG_TABLE[row[j]]) % 0xFF])
-            yield mixed
+        a, b, c, d = data[i:i + 4]
+        mixed += (MUL14[a] ^ MUL11[b] ^ MUL13[c] ^ MUL9[d],
+                  MUL9[a] ^ MUL14[b] ^ MUL11[c] ^ MUL13[d],
+                  MUL13[a] ^ MUL9[b] ^ MUL14[c] ^ MUL11[d],
+                  MUL11[a] ^ MUL13[b] ^ MUL9[c] ^ MUL14[d])
+    return mixed
 
 
 def shift_rows(data):
-    return [data[((column + row) & 0b11) * 4 + row] for column in range(4) for row in range(4)]
+    return bytes(SHIFT_ROWS(data))
 
 
 def shift_rows_inv(data):
-    return [data[((column - row) & 0b11) * 4 + row] for column in range(4) for row in range(4)]
-
-
-def shift_block(data):
-    data_shifted = []
-
-    bit = 0
-    for n in data:
-        if bit:
-            n |= 0x100
-        bit = n & 1
-        n >>= 1
-        data_shifted.append(n)
-
-    return data_shifted
+    return bytes(SHIFT_ROWS_INV(data))
 
 
 def inc(data):
-    data = data[:]  # copy
-    for i in range(len(data) - 1, -1, -1):
-        if data[i] == 255:
-            data[i] = 0
-        else:
-            data[i] = data[i] + 1
-            break
-    return data
+    size = len(data)
+    counter = (int.from_bytes(bytes(data), 'big') + 1) & ((1 << size * 8) - 1)
+    return counter.to_bytes(size, 'big')
 
 
 def block_product(block_x, block_y):
@@ -524,21 +689,35 @@ def block_product(block_x, block_y):
     if len(block_x) != BLOCK_SIZE_BYTES or len(block_y) != BLOCK_SIZE_BYTES:
         raise ValueError(f'Length of blocks need to be {BLOCK_SIZE_BYTES} bytes')
 
-    block_r = [0xE1] + [0] * (BLOCK_SIZE_BYTES - 1)
-    block_v = block_y[:]
-    block_z = [0] * BLOCK_SIZE_BYTES
+    block_z = gf128_mul(int.from_bytes(bytes(block_x), 'big'), int.from_bytes(bytes(block_y), 'big'))
+    return block_z.to_bytes(BLOCK_SIZE_BYTES, 'big')
 
-    for i in block_x:
-        for bit in range(7, -1, -1):
-            if i & (1 << bit):
-                block_z = xor(block_z, block_v)
 
-            do_xor = block_v[-1] & 1
-            block_v = shift_block(block_v)
-            if do_xor:
-                block_v = xor(block_v, block_r)
+def gf128_mul(x, y):
+    """
+    Multiply two GF(2^128) elements in GCM bit order, packed as big-endian ints
+    (NIST SP 800-38D, Algorithm 1)
+    """
+    z = 0
+    for bit in f'{x:0128b}':
+        if bit == '1':
+            z ^= y
+        y = (y >> 1) ^ GHASH_R if y & 1 else y >> 1
+    return z
 
-    return block_z
+
+@functools.lru_cache(maxsize=32)
+def ghash_subkey_powers(subkey):
+    """
+    Powers of the hash subkey used by the aggregated GHASH, computed once per subkey
+
+    @param {bytes} subkey  16-Byte hash subkey
+    @returns {int[]}       H^1 .. H^GHASH_PARALLEL_BLOCKS, where h_powers[k] is H^(k + 1)
+    """
+    h_powers = [int.from_bytes(subkey, 'big')]
+    while len(h_powers) < GHASH_PARALLEL_BLOCKS:
+        h_powers.append(gf128_mul(h_powers[-1], h_powers[0]))
+    return tuple(h_powers)
 
 
 def ghash(subkey, data):
@@ -547,28 +726,42 @@ def ghash(subkey, data):
     if len(data) % BLOCK_SIZE_BYTES:
         raise ValueError(f'Length of data should be {BLOCK_SIZE_BYTES} bytes')
 
-    last_y = [0] * BLOCK_SIZE_BYTES
-    for i in range(0, len(data), BLOCK_SIZE_BYTES):
-        block = data[i: i + BLOCK_SIZE_BYTES]
-        last_y = block_product(xor(last_y, block), subkey)
+    data = bytes(data)
+    blocks = [int.from_bytes(data[i: i + BLOCK_SIZE_BYTES], 'big') for i in range(0, len(data), BLOCK_SIZE_BYTES)]
+
+    h_powers = ghash_subkey_powers(bytes(subkey))
+
+    # Y' = (Y ^ X1)*H^n ^ X2*H^(n-1) ^ ... ^ Xn*H for every group of n blocks,
+    # so the products within a group are independent of each other
+    last_y = 0
+    for i in range(0, len(blocks), GHASH_PARALLEL_BLOCKS):
+        group = blocks[i: i + GHASH_PARALLEL_BLOCKS]
+        group[0] ^= last_y
+        last_y = 0
+        for block, h_power in zip(group, reversed(h_powers[:len(group)])):
+            last_y ^= gf128_mul(block, h_power)
 
-    return last_y
+    return last_y.to_bytes(BLOCK_SIZE_BYTES, 'big')
 
 
 __all__ = [
     'aes_cbc_decrypt',
     'aes_cbc_decrypt_bytes',
     'aes_ctr_decrypt',
+    'aes_ctr_decrypt_bytes',
     'aes_decrypt_text',
     'aes_decrypt',
     'aes_ecb_decrypt',
+    'aes_ecb_decrypt_bytes',
     'aes_gcm_decrypt_and_verify',
     'aes_gcm_decrypt_and_verify_bytes',
 
     'aes_cbc_encrypt',
     'aes_cbc_encrypt_bytes',
     'aes_ctr_encrypt',
+    'aes_ctr_encrypt_bytes',
     'aes_ecb_encrypt',
+    'aes_ecb_encrypt_bytes',
     'aes_encrypt',
 
     'key_expansion',
@@ -1,77 +1,278 @@
+import os
 import random
+import struct
 import time
 import logging
 import json
 import threading
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from chat_downloader import ChatDownloader
+from chat_downloader.errors import ChatDisabled, ChatDownloaderError, InvalidURL, LoginRequired, SiteNotSupported, VideoNotFound, VideoUnavailable
 from pathlib import Path
+from urllib.parse import urlparse
 import argparse
+import requests
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from cookies import convert_cookie_list_to_cookiejar, load_cookies
-from recorder.streamlink_recorder import VideoRecorderThread, check_livestream
+from recorder.streamlink_recorder import STATE_CHANGED, VideoRecorderThread, check_livestream, invalidate, warm_up
 
 # 直播地址
 TWITCH_URL = "https://www.twitch.tv/luoshushu0"
 YOUTUBE_URL = "https://www.youtube.com/channel/UC7QVieoTCNwwW84G0bddXpA/live"
+# 聊天记录批量写入的缓冲区大小和最长落盘间隔(秒)
+CHAT_BUFFER_SIZE = 64 * 1024
+CHAT_FLUSH_INTERVAL = 2
+# 缓冲区中的数据块达到该数量时也写入文件(需小于IOV_MAX)
+CHAT_FLUSH_MESSAGES = 64
+# 聊天连接中断后的重连次数和初始退避时间(秒)
+CHAT_MAX_RETRIES = 5
+CHAT_RETRY_DELAY = 0.5
+# 重试也无法恢复的聊天下载错误
+NON_RETRYABLE_CHAT_ERRORS = (ChatDisabled, InvalidURL, LoginRequired, SiteNotSupported, VideoNotFound, VideoUnavailable)
+# 断线重连可以恢复的聊天下载错误
+RETRYABLE_CHAT_ERRORS = (requests.RequestException, ConnectionError, TimeoutError, ChatDownloaderError)
+# 录制YouTube期间聊天线程重试失败退出后，至少间隔这么久(秒)才重新启动
+CHAT_RESTART_DELAY = 30
+# 单次直播状态检查的超时时间(秒)
+PROBE_TIMEOUT = 30
+# 都未开播时的最长检查间隔(秒)，也是都未开播时发现开播的最长延迟
+POLL_MAX_INTERVAL = 60
+# 被线程退出事件提前唤醒时，两次检查之间至少间隔的时间(秒)
+POLL_MIN_INTERVAL = 3
+# 录制线程启动后不到这么久(秒)就退出时认为启动失败，按指数退避推迟重新检查
+RECORDER_MIN_RUNTIME = 30
+# 录制文件保存目录，按日期分子目录
+RECORDINGS_DIR = Path("recordings")
+# 直播状态检查共用的线程池
+PROBE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix='probe')
+# 浏览器cookies缓存有效期(秒)
+COOKIE_CACHE_TTL = 1800
 
-def retry_on_failure(max_retries=5, delay=2, exceptions=(Exception,)):
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            for i in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except exceptions as e:
-                    if i == max_retries - 1:
-                        raise
-                    time.sleep(delay)
-            return None
-        return wrapper
-    return decorator
+if orjson:
+    def dump_message(message):
+        """把聊天消息序列化为UTF-8编码的JSON"""
+        return orjson.dumps(message)
+
+    def dump_line(message):
+        """把聊天消息序列化为一行UTF-8编码的JSON(包含换行符)"""
+        return orjson.dumps(message, option=orjson.OPT_APPEND_NEWLINE)
+else:
+    def dump_message(message):
+        """把聊天消息序列化为UTF-8编码的JSON"""
+        return json.dumps(message, ensure_ascii=False).encode('utf-8')
+
+    def dump_line(message):
+        """把聊天消息序列化为一行UTF-8编码的JSON(包含换行符)"""
+        return (json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8')
+
+def _write_all(f, data):
+    # 无缓冲文件的write可能只写入一部分
+    view = memoryview(data)
+    while view:
+        view = view[f.write(view):]
+
+if hasattr(os, 'writev'):
+    def _write_batch(f, batch, size):
+        """用一次writev系统调用写入一批数据"""
+        written = os.writev(f.fileno(), batch)
+        if written < size:
+            _write_all(f, b''.join(batch)[written:])
+else:
+    def _write_batch(f, batch, size):
+        """把一批数据拼接后一次写入"""
+        _write_all(f, b''.join(batch))
+
+# 按(站点域名, cookies文件内容)共用的ChatDownloader及其get_chat()锁，重新开播时复用已有的会话和连接
+_chat_downloaders = {}
+# 只保护_chat_downloaders字典本身，不在持有时做网络请求
+_chat_downloaders_lock = threading.Lock()
+
+def _cookies_fingerprint(cookies_file):
+    """返回cookies文件内容的指纹，文件被改写后随之变化，读取失败时返回None"""
+    try:
+        return hash(Path(cookies_file).read_bytes())
+    except OSError:
+        return None
+
+def get_chat_downloader(url, cookies_file=None):
+    """返回url所在站点和cookies文件对应的共用ChatDownloader，以及调用其get_chat()时要持有的锁"""
+    # ChatDownloader只在创建时读取一次cookies文件，按文件内容而不是路径区分，文件改写后会新建实例
+    key = (urlparse(url).netloc, cookies_file and _cookies_fingerprint(cookies_file))
+    with _chat_downloaders_lock:
+        entry = _chat_downloaders.get(key)
+        if entry is None:
+            # 同一站点旧cookies对应的实例不会再被取用，正在运行的聊天线程仍持有自己的引用
+            for stale in [k for k in _chat_downloaders if k[0] == key[0]]:
+                del _chat_downloaders[stale]
+            entry = _chat_downloaders[key] = (ChatDownloader(cookies=cookies_file), threading.Lock())
+        return entry
 
 class ChatDownloaderThread(threading.Thread):
-    def __init__(self, url, filename, cookie=None):
-        super().__init__()
+    def __init__(self, url, filename, cookies_file=None, binary=False):
+        super().__init__(daemon=True)
         self.url = url
         self.filename = filename
+        # binary为True时每条消息写成4字节小端长度前缀加JSON，否则写成NDJSON
+        self.binary = binary
         self._stop_event = threading.Event()
-        if cookie:
-            self.chat_downloader = ChatDownloader(cookies=';'.join([f"{k}={v}" for k, v in cookie.items()]) if isinstance(cookie, dict) else cookie)
-        else:
-            self.chat_downloader = ChatDownloader()
+        # 遇到重试也无法恢复的错误(例如聊天已关闭)时设置，本场直播不再重新启动
+        self.unrecoverable = False
+        # 线程退出的时间，用于推迟重新启动
+        self.ended_at = None
+        # 待写入的消息由下载线程和定时落盘线程共用，访问时都要持有_batch_lock
+        self._batch_lock = threading.Lock()
+        self._batch = []
+        self._batch_size = 0
+        self._file = None
+        self._closed = False
+        self._unsynced = False
+        self._last_sync = time.monotonic()
+        # ChatDownloader的cookies参数只接受Netscape格式的cookies文件路径
+        self.chat_downloader, self._chat_lock = get_chat_downloader(url, cookies_file)
 
     def stop(self):
         self._stop_event.set()
+        # 线程是守护线程，可能阻塞在等待新消息上而来不及退出，先把已收到的消息写入磁盘
+        try:
+            self._flush(sync=True)
+        except OSError as e:
+            logging.error(f"写入聊天记录时出错: {str(e)}")
 
     def stopped(self):
         return self._stop_event.is_set()
 
-    @retry_on_failure(max_retries=3, delay=0.1)
+    def _flush(self, sync=False):
+        """把缓冲区中的消息写入文件，距上次fsync超过间隔时间或sync为True时同步到磁盘"""
+        with self._batch_lock:
+            if self._batch:
+                if self._file is None:
+                    if self._closed:
+                        return
+                    # 有消息要写入时才创建文件，获取聊天失败时不会留下空文件
+                    self._file = open(self.filename, 'ab', buffering=0)
+                _write_batch(self._file, self._batch, self._batch_size)
+                self._batch.clear()
+                self._batch_size = 0
+                self._unsynced = True
+            # fsync代价较高，按时间间隔进行
+            now = time.monotonic()
+            if self._file is not None and self._unsynced and (sync or now - self._last_sync >= CHAT_FLUSH_INTERVAL):
+                os.fsync(self._file.fileno())
+                self._last_sync = now
+                self._unsynced = False
+
+    def _close(self):
+        """关闭聊天记录文件，之后不再写入"""
+        with self._batch_lock:
+            self._closed = True
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _flush_periodically(self, done):
+        """消息稀疏时也每隔CHAT_FLUSH_INTERVAL秒把缓冲区写入文件，直到done被设置"""
+        while not done.wait(CHAT_FLUSH_INTERVAL):
+            try:
+                self._flush()
+            except OSError as e:
+                logging.error(f"写入聊天记录时出错: {str(e)}")
+
+    def _write_messages(self, chat):
+        """把聊天消息放入缓冲区，攒够一批时写入文件，返回是否因为stop()而中止"""
+        for message in chat:
+            if self.stopped():
+                # ChatDownloader是共用的，只关闭当前的消息生成器
+                chat.chat.close()
+                return True
+
+            try:
+                if self.binary:
+                    data = dump_message(message)
+                    chunks = (struct.pack('<I', len(data)), data)
+                else:
+                    chunks = (dump_line(message),)
+                with self._batch_lock:
+                    self._batch.extend(chunks)
+                    self._batch_size += sum(map(len, chunks))
+                    full = len(self._batch) >= CHAT_FLUSH_MESSAGES or self._batch_size >= CHAT_BUFFER_SIZE
+                # stop()之后才放入缓冲区的消息也立即写入
+                if full or self.stopped():
+                    self._flush()
+
+            except Exception as e:
+                logging.error(f"处理消息时出错: {str(e)}")
+                continue
+        return False
+
     def run(self):
         try:
-            # 确保输出目录存在
-            Path(self.filename).parent.mkdir(parents=True, exist_ok=True)
-            
-            chat = self.chat_downloader.get_chat(self.url)
+            # 输出目录已由day_dir()创建
             logging.info(f"开始下载聊天记录到 {self.filename}")
-            with open(self.filename, 'a', encoding='utf-8') as f:
-                for message in chat:
-                    if self.stopped():
-                        self.chat_downloader.close()
-                        break
-
+            # 文件在第一次写入时打开且只打开一次，连接中断时只重新获取聊天迭代器，已写入的消息不会丢失
+            # 聊天迭代器在等待新消息时会阻塞，由单独的线程按时间间隔落盘
+            flush_done = threading.Event()
+            threading.Thread(target=self._flush_periodically, args=(flush_done,), daemon=True).start()
+            try:
+                for attempt in range(CHAT_MAX_RETRIES):
                     try:
-                        json.dump(message, f, ensure_ascii=False)
-                        f.write('\n')
-                        f.flush()
-
-                    except Exception as e:
-                        logging.error(f"处理消息时出错: {str(e)}")
-                        continue
+                        with self._chat_lock:
+                            chat = self.chat_downloader.get_chat(self.url)
+                        self._write_messages(chat)
+                        break
+                    except NON_RETRYABLE_CHAT_ERRORS:
+                        self.unrecoverable = True
+                        raise
+                    except RETRYABLE_CHAT_ERRORS as e:
+                        if self.stopped():
+                            break
+                        if attempt == CHAT_MAX_RETRIES - 1:
+                            raise
+                        logging.warning(f"聊天连接中断，正在重连: {str(e)}")
+                        # 指数退避加随机抖动，stop()时立即返回
+                        if self._stop_event.wait(CHAT_RETRY_DELAY * (2 ** attempt) + random.uniform(0, 0.5)):
+                            break
+            finally:
+                flush_done.set()
+                try:
+                    self._flush(sync=True)
+                finally:
+                    self._close()
             logging.info(f"聊天记录下载完成: {self.filename}")
         except Exception as e:
             logging.error(f"聊天下载失败: {str(e)}")
             raise e
+        finally:
+            self.ended_at = time.monotonic()
+            STATE_CHANGED.set()
+
+def day_dir(day):
+    """返回某天(YYYYMMDD)的录制目录，不存在时创建"""
+    # 每次开始录制时都检查，当天的目录中途被移走或删除后也能重新创建
+    path = RECORDINGS_DIR / day
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+class CookieCache:
+    """缓存已加载的cookies，超过有效期或被标记失效后才重新加载"""
+    def __init__(self, loader, ttl=COOKIE_CACHE_TTL):
+        self.loader = loader
+        self.ttl = ttl
+        self.cookies = None
+        self.loaded_at = None
+
+    def get(self):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at >= self.ttl:
+            self.cookies = self.loader()
+            self.loaded_at = time.monotonic()
+        return self.cookies
+
+    def invalidate(self):
+        self.loaded_at = None
 
 def save_youtubecookies_from_browser(filename):
     cookies = load_cookies(None, ['chrome'])
@@ -87,6 +288,7 @@ def main():
     parser.add_argument('-s', '--save-cookies', action='store_true', help="Save YouTube cookies to file and exit.")
     parser.add_argument('-l', '--local-cookies', type=str, default='youtube_cookies.txt', dest='cookies_file', help="Special YouTube cookies file path.")
     parser.add_argument('--cookies-file-only', action='store_true', help="Only load cookies from the specified local file.")
+    parser.add_argument('--binary-chat', action='store_true', help="Save chat as length-prefixed binary records instead of NDJSON.")
     parser.add_argument('--debug', action='store_true', help="Set logging level to DEBUG.")
     parser.add_argument( '--quiet', action='store_true', help="Set logging level to CRITICAL.")
     args = parser.parse_args()
@@ -99,71 +301,122 @@ def main():
         log_level = logging.CRITICAL
     # 设置日志
     logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    # 加载cookies的同时在后台预加载streamlink插件
+    threading.Thread(target=warm_up, args=((TWITCH_URL, YOUTUBE_URL),), daemon=True).start()
     
     youtube_video_thread = None
     twitch_video_thread = None
     youtube_chat_thread = None
     twitch_chat_thread = None
     
-    output_dir = Path("recordings") / datetime.now().strftime("%Y%m%d")
-    output_dir.mkdir(exist_ok=True)
     youtube_cookies_file = args.cookies_file
-    youtube_cookies_dict = None
+    chat_suffix = '.bin' if args.binary_chat else '.json'
 
     if args.save_cookies:
         save_youtubecookies_from_browser(youtube_cookies_file)
         exit(0)
 
+    saved_cookies_fingerprint = None
+
     def _load_cookies():
-        nonlocal youtube_cookies_dict
+        nonlocal saved_cookies_fingerprint
         # Load cookies only if not specified to use no cookies
-        if not args.no_cookies:
-            # If only local file is to be used, load from that file without updating
-            if args.cookies_file_only:
-                logging.info(f"只从文件 {youtube_cookies_file} 加载cookies")
-                cookies = load_cookies(youtube_cookies_file, None)
-            else:
-                # Load cookies from browser and update the file with them
-                cookies = load_cookies(None, ['chrome'])
-                # Update cookies file
+        if args.no_cookies:
+            return None
+        # If only local file is to be used, load from that file without updating
+        if args.cookies_file_only:
+            logging.info(f"只从文件 {youtube_cookies_file} 加载cookies")
+            cookies = load_cookies(youtube_cookies_file, None)
+        else:
+            # Load cookies from browser and update the file with them
+            cookies = load_cookies(None, ['chrome'])
+            # Update cookies file only when the cookies have changed
+            fingerprint = hash(tuple(sorted((c.domain, c.path, c.name, c.value or '') for c in cookies)))
+            if fingerprint != saved_cookies_fingerprint:
                 cookies.save(youtube_cookies_file)
-            # Get cookies specific to YouTube URL
-            array_cookies = cookies.get_cookies_for_url(YOUTUBE_URL)
-            # Convert cookie list to dictionary for easier usage in ChatDownloaderThread
-            youtube_cookies_dict = {cookie.name: cookie.value for cookie in array_cookies }
-            # If no cookies were found, prompt the user to log into YouTube
-            if not youtube_cookies_dict:
-                logging.error("请先登录YouTube")
-                exit(1)
-
-    _load_cookies()
-
-    is_youtube_live = False
-    is_twitch_live = False
+                saved_cookies_fingerprint = fingerprint
+        # Get cookies specific to YouTube URL
+        array_cookies = cookies.get_cookies_for_url(YOUTUBE_URL)
+        # Convert cookie list to dictionary for easier usage in ChatDownloaderThread
+        cookies_dict = {cookie.name: cookie.value for cookie in array_cookies }
+        # If no cookies were found, prompt the user to log into YouTube
+        if not cookies_dict:
+            logging.error("请先登录YouTube")
+            exit(1)
+        return cookies_dict
+
+    cookie_cache = CookieCache(_load_cookies)
+    youtube_cookies_dict = cookie_cache.get()
+
+    def _new_filenames(prefix):
+        """生成新录制的视频和聊天文件名，按开始时间放入当天的目录"""
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        output_dir = day_dir(timestamp[:8])
+        return str(output_dir / f"{prefix}_{timestamp}.ts"), str(output_dir / f"{prefix}_{timestamp}{chat_suffix}")
+
+    # offline: 都未开播; twitch_live: 正在录制Twitch; youtube_live: 正在录制YouTube
+    state = 'offline'
+    offline_streak = 0
+    # 录制线程的启动时间和连续启动失败的次数
+    recorder_started = None
+    failed_starts = 0
     try:
         while True:
             try:
-                if twitch_video_thread is None or not twitch_video_thread.is_alive():
+                # 录制线程退出后回到offline状态
+                if state == 'twitch_live' and not twitch_video_thread.is_alive():
+                    logging.info("Twitch录制结束")
+                    state = 'offline'
+                elif state == 'youtube_live' and not youtube_video_thread.is_alive():
+                    logging.info("YouTube录制结束")
+                    # 认证失败时立即重新加载cookies
+                    if youtube_video_thread.auth_failed:
+                        cookie_cache.invalidate()
+                    state = 'offline'
+
+                # 录制线程刚启动就退出(例如能检测到开播但无法打开流)时，本轮不再检查，按退避等待后再试
+                retry_later = False
+                if state == 'offline' and recorder_started is not None:
+                    if time.monotonic() - recorder_started < RECORDER_MIN_RUNTIME:
+                        failed_starts += 1
+                        offline_streak = failed_starts
+                        retry_later = True
+                        logging.warning(f"录制线程启动后很快退出，已连续失败{failed_starts}次，稍后重试")
+                    else:
+                        failed_starts = 0
+                    recorder_started = None
+
+                start_twitch = False
+                if state == 'offline' and not retry_later:
+                    # 缓存有效期内直接返回，过期后重新从浏览器加载
+                    youtube_cookies_dict = cookie_cache.get()
+                    # 轮询间隔已经按退避延长，不再叠加未开播结果的缓存时间，否则开播后要等两者之和才能发现
+                    invalidate(TWITCH_URL)
+                    invalidate(YOUTUBE_URL)
+                    # 并发检查两个平台，单次轮询耗时取决于较慢的一方而不是两者之和
+                    logging.debug("检查Twitch和YouTube直播状态")
+                    twitch_future = PROBE_POOL.submit(check_livestream, TWITCH_URL)
+                    youtube_future = PROBE_POOL.submit(check_livestream, YOUTUBE_URL, youtube_cookies_dict)
+                    # 两个检查共用同一个超时期限
+                    deadline = time.monotonic() + PROBE_TIMEOUT
+                    if twitch_future.result(timeout=PROBE_TIMEOUT):
+                        # Twitch优先；YouTube检查已经在另一个线程中运行，无法取消，直接忽略其结果
+                        start_twitch = True
+                    elif youtube_future.result(timeout=max(0, deadline - time.monotonic())):
+                        video_filename, chat_filename = _new_filenames("youtube")
+                        youtube_video_thread = VideoRecorderThread(YOUTUBE_URL, video_filename, youtube_cookies_dict)
+                        youtube_video_thread.start()
+                        recorder_started = time.monotonic()
+                        if not (youtube_chat_thread and youtube_chat_thread.is_alive()):
+                            youtube_chat_thread = ChatDownloaderThread(YOUTUBE_URL, chat_filename, youtube_cookies_file, binary=args.binary_chat)
+                            youtube_chat_thread.start()
+                        state = 'youtube_live'
+                elif state == 'youtube_live':
+                    # 录制YouTube时只需要检查Twitch是否开播
                     logging.debug("检查Twitch直播状态")
-                    is_twitch_live = check_livestream(TWITCH_URL)
-                if not is_twitch_live and (youtube_video_thread is None or not youtube_video_thread.is_alive()):
-                    logging.debug("检查YouTube直播状态")
-                    is_youtube_live = check_livestream(YOUTUBE_URL, youtube_cookies_dict)
-                
-                # Twitch开播时
-                if is_twitch_live and (not twitch_video_thread or not twitch_video_thread.is_alive()):
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    video_filename = output_dir / f"twitch_{timestamp}.ts"
-                    chat_filename = output_dir / f"twitch_{timestamp}.json"
-                    if twitch_video_thread is None or not twitch_video_thread.is_alive():
-                        twitch_video_thread = VideoRecorderThread(TWITCH_URL, str(video_filename))
-                        twitch_video_thread.start()
-                    if twitch_chat_thread is None or not twitch_chat_thread.is_alive():
-                        twitch_chat_thread = ChatDownloaderThread(TWITCH_URL, str(chat_filename))
-                        twitch_chat_thread.start()
-                    
-                    # 如果YouTube在录制，则停止
-                    if youtube_video_thread:
+                    if check_livestream(TWITCH_URL):
+                        start_twitch = True
                         youtube_video_thread.stop()
                         youtube_video_thread.join(timeout=5)
                         youtube_video_thread = None
@@ -172,36 +425,51 @@ def main():
                             youtube_chat_thread.join(timeout=5)
                             youtube_chat_thread = None
                         logging.info("停止YouTube录制和聊天下载")
-                
-                # YouTube开播且Twitch未开播时
-                elif is_youtube_live and not is_twitch_live:
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    video_filename = output_dir / f"youtube_{timestamp}.ts"
-                    chat_filename = output_dir / f"youtube_{timestamp}.json"
-                    if youtube_video_thread is None or not youtube_video_thread.is_alive():
-                        youtube_video_thread = VideoRecorderThread(YOUTUBE_URL, str(video_filename), youtube_cookies_dict)
-                        youtube_video_thread.start()
-                    if youtube_chat_thread is None or not youtube_chat_thread.is_alive():
-                        youtube_chat_thread = ChatDownloaderThread(YOUTUBE_URL, str(chat_filename), youtube_cookies_file)
+                    elif (not youtube_chat_thread.is_alive() and not youtube_chat_thread.unrecoverable
+                            and time.monotonic() - youtube_chat_thread.ended_at >= CHAT_RESTART_DELAY):
+                        # 同一场直播的聊天继续追加到原来的文件
+                        youtube_chat_thread = ChatDownloaderThread(YOUTUBE_URL, youtube_chat_thread.filename, youtube_cookies_file, binary=args.binary_chat)
                         youtube_chat_thread.start()
-                
+
+                if start_twitch:
+                    video_filename, chat_filename = _new_filenames("twitch")
+                    twitch_video_thread = VideoRecorderThread(TWITCH_URL, video_filename)
+                    twitch_video_thread.start()
+                    recorder_started = time.monotonic()
+                    if not (twitch_chat_thread and twitch_chat_thread.is_alive()):
+                        twitch_chat_thread = ChatDownloaderThread(TWITCH_URL, chat_filename, binary=args.binary_chat)
+                        twitch_chat_thread.start()
+                    state = 'twitch_live'
+
             except Exception as e:
                 logging.error(f"发生错误: {str(e)}")
-            
-            if is_youtube_live and (not youtube_chat_thread or not youtube_video_thread.is_alive()):
-                # 如果YouTube直播结束，重新加载cookies
-                _load_cookies()
-            # delay 1~7 second to check status
-            time.sleep(random.randint(1, 7))
+
+            # 有直播时1~2秒检查一次，都未开播时按指数退避延长间隔，线程退出时提前唤醒
+            if state != 'offline':
+                offline_streak = 0
+                delay = random.uniform(1, 2)
+            else:
+                offline_streak += 1
+                delay = min(POLL_MAX_INTERVAL, 2 ** min(offline_streak, 6)) + random.uniform(0, 1)
+            wait_started = time.monotonic()
+            if STATE_CHANGED.wait(timeout=delay):
+                STATE_CHANGED.clear()
+                # 事件只缩短等待时间而不取消等待
+                remaining = min(delay, POLL_MIN_INTERVAL) - (time.monotonic() - wait_started)
+                if remaining > 0:
+                    time.sleep(remaining)
     except KeyboardInterrupt:
         logging.info("收到退出信号，正在清理...")
     finally:
-        # 确保所有线程都被正确停止
-        for thread in [youtube_video_thread, twitch_video_thread, 
-                      youtube_chat_thread, twitch_chat_thread]:
-            if thread:
-                thread.stop()
-                thread.join(timeout=5)
+        PROBE_POOL.shutdown(wait=False, cancel_futures=True)
+        # 确保所有线程都被正确停止：先全部通知停止，再在同一个期限内等待
+        threads = [thread for thread in (youtube_video_thread, twitch_video_thread,
+                                         youtube_chat_thread, twitch_chat_thread) if thread]
+        for thread in threads:
+            thread.stop()
+        deadline = time.monotonic() + 5
+        for thread in threads:
+            thread.join(timeout=max(0, deadline - time.monotonic()))
 
 if __name__ == "__main__":
     main()
@@ -1,24 +1,221 @@
+import ctypes
+import functools
 import logging
-from pathlib import Path
+import os
+import sys
 import threading
+import time
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
 import streamlink
 import streamlink.session
+from streamlink.session.http_useragents import FIREFOX
 
+# 直播状态缓存时间(秒)：未开播时逐次加倍直到上限，开播时短时间缓存
+# 录制YouTube时Twitch的检查结果靠这个缓存限流，Twitch开播最多延迟OFFLINE_CACHE_MAX_TTL+2秒才被发现
+LIVE_CACHE_TTL = 10
+OFFLINE_CACHE_TTL = 30
+OFFLINE_CACHE_MAX_TTL = 60
+
+# 录制/聊天线程退出时设置，主循环据此提前结束等待
+STATE_CHANGED = threading.Event()
+
+_live_cache = {}
+_live_cache_lock = threading.Lock()
+
+def ttl_cache(seconds_when_true=LIVE_CACHE_TTL, seconds_when_false=OFFLINE_CACHE_TTL, max_seconds=OFFLINE_CACHE_MAX_TTL):
+    """按url缓存直播状态检查结果，连续未开播时延长缓存时间"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(url, *args, **kwargs):
+            now = time.monotonic()
+            with _live_cache_lock:
+                entry = _live_cache.get(url)
+                if entry and entry[0] > now:
+                    return entry[1]
+                misses = entry[2] if entry else 0
+            value = func(url, *args, **kwargs)
+            if value:
+                ttl = seconds_when_true
+                misses = 0
+            else:
+                ttl = min(max_seconds, seconds_when_false * (2 ** misses))
+                misses += 1
+            with _live_cache_lock:
+                _live_cache[url] = (time.monotonic() + ttl, value, misses)
+            return value
+        return wrapper
+    return decorator
+
+# 所有直播状态检查共用的连接池，快速检查和streamlink会话都挂载它，已建立的keep-alive连接可以互相复用
+PROBE_ADAPTER = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+SESSION = requests.Session()
+SESSION.headers['User-Agent'] = FIREFOX
+SESSION.mount('https://', PROBE_ADAPTER)
+SESSION.mount('http://', PROBE_ADAPTER)
+
+TWITCH_GQL_URL = "https://gql.twitch.tv/gql"
+TWITCH_CLIENT_ID = "kimne78kjlwyf6xq2xgk7g1a3mfp5"
+PROBE_TIMEOUT = 5
+
+# 服务器返回这些HTTP状态码时认为cookies已失效
+AUTH_ERROR_STATUS = (401, 403)
+
+# 录制时每次读取的块大小和输出文件缓冲区大小
+RECORD_CHUNK_SIZE = 4 * 1024 * 1024
+RECORD_BUFFER_SIZE = 4 * 1024 * 1024
+# 每写入这么多数据，通知内核丢弃已落盘部分的页缓存
+PAGE_CACHE_DROP_INTERVAL = 64 * 1024 * 1024
+# 录制文件每次预分配的大小，剩余空间不足该余量时继续扩展
+PREALLOCATE_SIZE = 256 * 1024 * 1024
+PREALLOCATE_MARGIN = 32 * 1024 * 1024
+# fallocate(2)只分配磁盘空间而不改变文件大小的标志
+FALLOC_FL_KEEP_SIZE = 0x01
+HAS_FADVISE = hasattr(os, 'posix_fadvise')
+
+def _load_fallocate():
+    """返回Linux libc中的fallocate，不可用时返回None"""
+    # os.posix_fallocate会把文件大小扩展到预分配的位置，中途崩溃时文件末尾会留下大段的0
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fallocate = getattr(libc, 'fallocate64', None) or libc.fallocate
+    except (OSError, AttributeError):
+        return None
+    fallocate.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64)
+    fallocate.restype = ctypes.c_int
+    return fallocate
+
+_fallocate = _load_fallocate()
+
+def _preallocate(fd, offset, length):
+    """尽量为文件预分配磁盘空间且不改变文件大小，失败时返回False"""
+    if _fallocate is None:
+        return False
+    if _fallocate(fd, FALLOC_FL_KEEP_SIZE, offset, length) == 0:
+        return True
+    err = ctypes.get_errno()
+    logging.debug(f"预分配磁盘空间失败，不再预分配: {os.strerror(err)}")
+    return False
+
+def _quick_probe(url, cookie=None):
+    """不经过streamlink直接请求页面判断是否开播，无法判断时返回None"""
+    host = urlparse(url).netloc
+    if host.endswith('twitch.tv'):
+        login = urlparse(url).path.strip('/').split('/')[0]
+        r = SESSION.post(TWITCH_GQL_URL, timeout=PROBE_TIMEOUT,
+                         headers={'Client-ID': TWITCH_CLIENT_ID},
+                         json={'query': 'query { user(login: "%s") { stream { id } } }' % login})
+        r.raise_for_status()
+        user = (r.json().get('data') or {}).get('user')
+        if user is None:
+            return None
+        return user.get('stream') is not None
+    if host.endswith('youtube.com'):
+        r = SESSION.get(url, timeout=PROBE_TIMEOUT, cookies=cookie if isinstance(cookie, dict) else None,
+                        headers={'accept-language': 'en'})
+        r.raise_for_status()
+        if b'"isLiveNow":true' in r.content or b'hlsManifestUrl' in r.content:
+            return True
+        # 未开播时/live会显示频道主页，同意页等其他页面交给streamlink判断
+        if b'ytInitialData' in r.content:
+            return False
+    return None
+
+def invalidate(url):
+    """清除url的直播状态缓存，下次检查时重新请求"""
+    with _live_cache_lock:
+        _live_cache.pop(url, None)
+
+@functools.lru_cache(maxsize=4)
+def _cookie_header(cookie_items):
+    return ';'.join([f"{k}={v}" for k, v in sorted(cookie_items)])
+
+def cookies_to_header(cookie):
+    """把cookies字典拼接为name=value;name=value格式的字符串，字符串原样返回"""
+    if isinstance(cookie, dict):
+        return _cookie_header(frozenset(cookie.items()))
+    return cookie
+
+@functools.lru_cache(maxsize=4)
+def _cached_session(cookie_header):
+    session = streamlink.session.Streamlink()
+    session.http.mount('https://', PROBE_ADAPTER)
+    session.http.mount('http://', PROBE_ADAPTER)
+    if cookie_header:
+        session.set_option('http-cookies', cookie_header)
+    return session
+
+def get_session(cookie=None):
+    """返回使用指定cookies的共用Streamlink会话，避免每次检查都重新初始化"""
+    return _cached_session(cookies_to_header(cookie) or None)
+
+def warm_up(urls):
+    """预先解析url加载对应的streamlink插件，缩短第一次检查直播状态的耗时"""
+    for url in urls:
+        try:
+            get_session().resolve_url(url)
+        except (OSError, streamlink.StreamlinkError) as e:
+            logging.debug(f"预加载{url} 插件失败: {str(e)}")
+
+@ttl_cache()
 def check_livestream(url, cookie = None):
     """检查Twitch直播状态"""
     try:
-        streamlinklocal = streamlink.session.Streamlink()
-        if cookie:
-            streamlinklocal.set_option('http-cookies', cookie)
-        streams = streamlinklocal.streams(url)
+        live = _quick_probe(url, cookie)
+        if live is not None:
+            return live
+    except (OSError, ValueError) as e:
+        logging.debug(f"快速检查{url} 直播状态失败: {str(e)}")
+    try:
+        streams = get_session(cookie).streams(url)
         return len(streams) > 0
-    except Exception as e:
+    except (OSError, streamlink.StreamlinkError) as e:
         logging.error(f"检查{url} 直播状态失败: {str(e)}")
         return False
 
+def _http_status(error):
+    """沿异常链查找requests的HTTP错误并返回其状态码，找不到时返回None"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, requests.HTTPError) and error.response is not None:
+            return error.response.status_code
+        # streamlink把原始异常保存在err属性中，同时作为__cause__抛出
+        error = getattr(error, 'err', None) or error.__cause__ or error.__context__
+    return None
+
+def _pump(src, dst, stop_event, chunk=RECORD_CHUNK_SIZE, on_write=None):
+    """把src中的数据按块复制到dst，直到读完或stop_event被设置"""
+    write = dst.write
+    readinto = getattr(src, 'readinto', None)
+    if readinto:
+        # 支持readinto时复用同一块缓冲区，避免每次读取都分配新的bytes
+        buf = memoryview(bytearray(chunk))
+        while not stop_event.is_set():
+            n = readinto(buf)
+            if not n:
+                break
+            write(buf[:n])
+            if on_write:
+                on_write(n)
+        return
+    read = src.read
+    while not stop_event.is_set():
+        data = read(chunk)
+        if not data:
+            break
+        write(data)
+        if on_write:
+            on_write(len(data))
+
+# 录制只是在网络和磁盘之间搬运数据，读写时会释放GIL，用线程即可；
+# 改用多进程还需要跨进程同步STATE_CHANGED、直播状态缓存和auth_failed
 class VideoRecorderThread(threading.Thread):
     def __init__(self, url, filename, cookie = None, quality='best'):
-        super().__init__()
+        super().__init__(daemon=True)
         self.url = url
         self.filename = filename
         self.cookie = cookie
@@ -26,61 +223,97 @@ class VideoRecorderThread(threading.Thread):
         self._stop_event = threading.Event()
         self.stream_fd = None
         self.output_fd = None
+        # cookies被服务器拒绝时设置，主循环据此重新加载cookies
+        self.auth_failed = False
+        self._written = 0
+        self._advised = 0
+        self._allocated = 0
         
     def stop(self):
         self._stop_event.set()
         if self.stream_fd:
             try:
                 self.stream_fd.close()
-            except:
+            except OSError:
                 pass
         if self.output_fd:
             try:
                 self.output_fd.close()
-            except:
+            except OSError:
                 pass
         
     def stopped(self):
         return self._stop_event.is_set()
+
+    def _on_write(self, size):
+        """记录已写入的数据量，按需扩展预分配空间并丢弃已落盘部分的页缓存"""
+        self._written += size
+        while self._allocated and self._written > self._allocated - PREALLOCATE_MARGIN:
+            # 预分配只是优化，失败(例如剩余空间不足一整块)时继续录制
+            if not _preallocate(self.output_fd.fileno(), self._allocated, PREALLOCATE_SIZE):
+                self._allocated = 0
+                break
+            self._allocated += PREALLOCATE_SIZE
+        # 录制文件不会再被读取，定期落盘后丢弃其页缓存
+        if HAS_FADVISE and self._written - self._advised >= PAGE_CACHE_DROP_INTERVAL:
+            self._release_written()
+
+    def _release_written(self):
+        fd = self.output_fd.fileno()
+        self.output_fd.flush()
+        os.fdatasync(fd)
+        os.posix_fadvise(fd, self._advised, self._written - self._advised, os.POSIX_FADV_DONTNEED)
+        self._advised = self._written
         
     def run(self):
         try:
-            if self.cookie:
-                streamlink_session = streamlink.session.Streamlink()
-                streamlink_session.set_option('http-cookies', self.cookie)
-                streams = streamlink_session.streams(self.url)
-            else:
-                streams = streamlink.streams(self.url)
+            streams = get_session(self.cookie).streams(self.url)
             if not streams:
                 logging.error(f"无法获取直播流: {self.url}")
                 return
                 
             stream = streams[self.quality]
-            Path(self.filename).parent.mkdir(parents=True, exist_ok=True)
             
             self.stream_fd = stream.open()
-            self.output_fd = open(self.filename, 'wb')
+            self.output_fd = open(self.filename, 'wb', buffering=RECORD_BUFFER_SIZE)
+            if HAS_FADVISE:
+                os.posix_fadvise(self.output_fd.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            # 按大块预分配磁盘空间，减少长时间录制产生的碎片和元数据更新
+            if _preallocate(self.output_fd.fileno(), 0, PREALLOCATE_SIZE):
+                self._allocated = PREALLOCATE_SIZE
             logging.info(f"开始录制视频到文件 {self.filename}")
-            while not self.stopped():
-                try:
-                    data = self.stream_fd.read(1024*1024)
-                    if not data:
-                        break
-                    self.output_fd.write(data)
-                except Exception as e:
-                    logging.error(f"Twitch录制过程中出错: {str(e)}")
-                    break
+            try:
+                _pump(self.stream_fd, self.output_fd, self._stop_event, on_write=self._on_write)
+            except Exception as e:
+                logging.error(f"Twitch录制过程中出错: {str(e)}")
             logging.info(f"录制结束: {self.filename}")
         except Exception as e:
             logging.error(f"视频录制失败: {str(e)}")
+            if self.cookie and _http_status(e) in AUTH_ERROR_STATUS:
+                self.auth_failed = True
         finally:
+            # 录制结束后直播状态可能已变化，强制下次重新检查
+            invalidate(self.url)
+            STATE_CHANGED.set()
+            # 录制结束时把最后一段不足间隔的数据也移出页缓存
+            if HAS_FADVISE and self.output_fd and self._written > self._advised:
+                try:
+                    self._release_written()
+                except (OSError, ValueError):
+                    pass
             if self.stream_fd:
                 try:
                     self.stream_fd.close()
-                except:
+                except OSError:
                     pass
             if self.output_fd:
                 try:
                     self.output_fd.close()
-                except:
+                except OSError:
+                    pass
+            # 释放文件末尾之后预分配但没有用到的磁盘空间
+            if self._allocated:
+                try:
+                    os.truncate(self.filename, self._written)
+                except OSError:
                     pass
\ No newline at end of file
@@ -1,61 +1,77 @@
 import logging
-from pathlib import Path
+import os
+import signal
+import subprocess
+import sys
 import threading
 import yt_dlp
+from utils import Popen
+
+# stop()后等待yt-dlp进程自行结束的时间(秒)，超时后强制结束
+STOP_TIMEOUT = 10
 
 class VideoRecorderThread(threading.Thread):
     def __init__(self, url, filename, download_chat=False, cookie_browsers=['chrome']) :
-        super().__init__()
+        super().__init__(daemon=True)
         self.url = url
         self.filename = filename
         self.download_chat = download_chat
         self.cookie_browsers = cookie_browsers
         self._stop_event = threading.Event()
-        self.process = None
         
     def stop(self):
         self._stop_event.set()
-        if self.process:
-            try:
-                self.process.terminate()
-            except Exception:
-                pass
         
     def stopped(self):
         return self._stop_event.is_set()
+
+    def _command(self):
+        """生成yt-dlp命令行"""
+        # 直播HLS由yt-dlp交给ffmpeg下载，进度回调不会被调用，只能在子进程中下载才能中途停止
+        command = [sys.executable, '-m', 'yt_dlp', '--quiet', '--no-warnings',
+                   '--cookies-from-browser', ':'.join(self.cookie_browsers),
+                   '-o', self.filename]
+        # '--live-from-start' Not work with format best
+        # '-f', 'best' 优先下载视频
+        if self.download_chat:
+            command += ['--write-subs', '--sub-langs', 'live_chat']
+        return command + ['--', self.url]
+
+    def _interrupt(self, process):
+        """让yt-dlp进程结束录制，超时后强制结束"""
+        # POSIX上发送SIGINT，yt-dlp会通知ffmpeg正常收尾，录制的文件可以播放
+        if os.name == 'posix':
+            process.send_signal(signal.SIGINT)
+        else:
+            process.terminate()
+        try:
+            process.wait(timeout=STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill(timeout=None)
         
     def run(self):
         try:
-            # 确保输出目录存在
-            Path(self.filename).parent.mkdir(parents=True, exist_ok=True)
-
-            ydl_opts = {
-                'outtmpl': self.filename,
-                'quiet': True,
-                'no_warnings': True,
-                'cookiesfrombrowser': self.cookie_browsers,
-                # 'live_from_start': True, # Not work with format best
-                # 'format': 'best', # 优先下载视频
-            }
-
             if self.download_chat:
-                ydl_opts = {**ydl_opts, ** {'subtitleslangs': ['live_chat'],'writesubtitles': True,}}
                 logging.info(f"开始下载YouTube实时聊天: {self.url}")
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                self.process = ydl.download([self.url])
+
+            # yt-dlp会自行创建输出目录
+            with Popen(self._command(), stdin=subprocess.DEVNULL) as process:
+                # 每秒检查一次是否需要停止
+                while process.poll() is None:
+                    if self._stop_event.wait(1):
+                        self._interrupt(process)
+                        break
+
+            if self.stopped():
+                logging.info(f"录制已停止: {self.filename}")
+            elif process.returncode:
+                raise yt_dlp.utils.DownloadError(f"yt-dlp退出码 {process.returncode}")
                 
         except Exception as e:
             if self.download_chat:
                 logging.error(f"YouTube实时聊天下载失败:{str(e)}")
             else:
                 logging.error(f"YouTube视频录制失败: {str(e)}")
-        finally:
-            if self.process:
-                try:
-                    self.process.terminate()
-                except:
-                    pass
 
 
 def check_livestream(url, cookie_browsers=['chrome']):
@@ -65,24 +81,23 @@ def check_livestream(url, cookie_browsers=['chrome']):
             'quiet': True,
             'no_warnings': True,
             'cookiesfrombrowser': cookie_browsers,
+            'extract_flat': 'in_playlist',
+            'skip_download': True,
+            'youtube_include_dash_manifest': False,
         }
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            # 只运行提取器，不做格式枚举等后处理
+            info = ydl.extract_info(url, download=False, process=False)
+            # /live 页面会先解析为指向直播视频的链接
+            if info.get('_type') in ('url', 'url_transparent'):
+                info = ydl.extract_info(info['url'], download=False, process=False)
+            if info.get('is_live') is not None:
+                return info['is_live']
+            if info.get('live_status'):
+                return info['live_status'] == 'is_live'
+            # 无法判断时走完整流程
             info = ydl.extract_info(url, download=False)
             return info.get('is_live', False)
-    except Exception as e:
+    except (OSError, yt_dlp.utils.YoutubeDLError) as e:
         logging.error(f"Error checking YouTube live status: {str(e)}")
         return False
-
-# def check_youtube_live(url, cookie_browsers=['chrome']):
-#     """检查YouTube直播状态"""
-#     try:
-#         ydl_opts = {
-#             'quiet': True,
-#             'no_warnings': True,
-#             'cookiesfrombrowser': cookie_browsers,
-#         }
-#         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-#             info = ydl.extract_info(url, download=False)
-#             return info.get('is_live', False)
-#     except:
-#         return False
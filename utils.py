@@ -2,6 +2,14 @@ import os
 import subprocess
 import sys
 
+# Resolve the cmd.exe path once at import instead of on every spawn; None when it cannot be found
+_COMSPEC = None
+if os.name == 'nt':
+    _COMSPEC = os.environ.get('ComSpec') or os.path.join(
+        os.environ.get('SystemRoot', ''), 'System32', 'cmd.exe')
+    if not os.path.isabs(_COMSPEC):
+        _COMSPEC = None
+
 
 class Popen(subprocess.Popen):
     if sys.platform == 'win32':
@@ -50,17 +58,12 @@ class Popen(subprocess.Popen):
             shell = False
             # Set variable for `cmd.exe` newline escaping (see `utils.shell_quote`)
             env['='] = '"^\n\n"'
-            args = f'{self.__comspec()} /Q /S /D /V:OFF /E:ON /C "{args}"'
+            if _COMSPEC is None:
+                raise FileNotFoundError('shell not found: neither %ComSpec% nor %SystemRoot% is set')
+            args = f'{_COMSPEC} /Q /S /D /V:OFF /E:ON /C "{args}"'
 
         super().__init__(args, *remaining, env=env, shell=shell, **kwargs, startupinfo=self._startupinfo)
 
-    def __comspec(self):
-        comspec = os.environ.get('ComSpec') or os.path.join(
-            os.environ.get('SystemRoot', ''), 'System32', 'cmd.exe')
-        if os.path.isabs(comspec):
-            return comspec
-        raise FileNotFoundError('shell not found: neither %ComSpec% nor %SystemRoot% is set')
-
     def communicate_or_kill(self, *args, **kwargs):
         try:
             return self.communicate(*args, **kwargs)